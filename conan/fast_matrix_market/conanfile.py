@@ -1,4 +1,5 @@
 from conan import ConanFile
+from conan.errors        import ConanInvalidConfiguration
 from conan.tools.files   import copy, get, export_conandata_patches, rmdir
 from conan.tools.cmake   import CMake, CMakeDeps, CMakeToolchain, cmake_layout
 import os
@@ -15,19 +16,42 @@ class FastMatrixMarketConan(ConanFile):
 
     settings         = "os", "arch", "compiler", "build_type"
     options          = {
-        "shared"          : [True, False],          # for ryu sub-library
+        "shared"          : [True, False],          # for ryu / dragonbox sub-libraries
         "with_fast_float" : [True, False],
         "with_dragonbox"  : [True, False],
         "with_ryu"        : [True, False],
+        "shortest_only"   : [True, False],          # only shortest round-trip float output, set to False for Ryu
+        "parallelism"     : ["ANY"],                # default reader/writer threads, 0 = all cores
     }
     default_options  = {
-        "shared"          : False,
+        "shared"          : True,                   # one copy of the conversion tables for all executables
         "with_fast_float" : True,
         "with_dragonbox"  : True,
-        "with_ryu"        : True,
+        "with_ryu"        : False,
+        "shortest_only"   : True,
+        "parallelism"     : "0",
     }
 
-    package_type     = "library"   # treat as a normal package, not header-only
+    # Conan resolves "library" to shared-library or static-library from the
+    # shared option, so static and shared builds get distinct binaries.
+    package_type     = "library"
+
+    # ──────────────────────────────────────────────────────────────────────────
+    def validate(self):
+        # Dragonbox covers shortest round-trip writes and fast_float covers
+        # parsing. Ryu is only needed for fixed-precision output.
+        if self.options.shortest_only and self.options.with_ryu:
+            raise ConanInvalidConfiguration(
+                "with_ryu=True requires shortest_only=False")
+        if not str(self.options.parallelism).isdigit():
+            raise ConanInvalidConfiguration(
+                f"parallelism must be a non-negative integer, got {self.options.parallelism}")
+
+    # ──────────────────────────────────────────────────────────────────────────
+    def package_id(self):
+        # shortest_only only guards with_ryu in validate(), the build is
+        # determined by with_ryu alone
+        del self.info.options.shortest_only
 
     # ──────────────────────────────────────────────────────────────────────────
     def layout(self):
@@ -75,6 +99,9 @@ class FastMatrixMarketConan(ConanFile):
 
     # ──────────────────────────────────────────────────────────────────────────
     def package_info(self):
+        # Upstream has no build-time default for the thread count, so hand it to
+        # consumers which pass it as read_options::num_threads
+        self.cpp_info.defines.append(f"FMM_PARALLELISM_DEFAULT={self.options.parallelism}")
         if self.options.with_dragonbox:
             self.cpp_info.libs.append("dragonbox_to_chars")
         if self.options.with_ryu:
@@ -2,8 +2,9 @@ from conan import ConanFile
 from conan.errors import ConanInvalidConfiguration
 from conan.tools.build import check_min_cppstd
 from conan.tools.cmake import CMake, CMakeDeps, CMakeToolchain, cmake_layout
-from conan.tools.files import apply_conandata_patches, copy, export_conandata_patches, get, rm, rmdir
+from conan.tools.files import apply_conandata_patches, copy, export_conandata_patches, get, load, rm, rmdir, save
 from conan.tools.microsoft import is_msvc, is_msvc_static_runtime
+import json
 import os
 
 
@@ -24,6 +25,7 @@ class GrapheneConan(ConanFile):
         "ipu_arch_ipu1": [True, False],
         "ipu_arch_ipu2": [True, False],
         "ipu_arch_ipu21": [True, False],
+        "with_metis": [True, False],
     }
     default_options = {
         "shared": False,
@@ -31,8 +33,8 @@ class GrapheneConan(ConanFile):
         "ipu_arch_ipu1": False,
         "ipu_arch_ipu2": True,
         "ipu_arch_ipu21": True,
+        "with_metis": True,
     }
-    generators = "CMakeDeps", "CMakeToolchain"
     implements = ["auto_shared_fpic"]
 
 
@@ -45,26 +47,33 @@ class GrapheneConan(ConanFile):
     def layout(self):
         cmake_layout(self, src_folder=".")
         self.cpp.source.includedirs = ["libgraphene"]
-        self.cpp.build.libdirs = [
-            "libgraphene/libgraphene/codelet",
-            "libgraphene/libgraphene/common",
-            "libgraphene/libgraphene/dsl/common",
-            "libgraphene/libgraphene/dsl/tensor",
-            "libgraphene/libgraphene/dsl/code",
-            "libgraphene/libgraphene/matrix",
-            "libgraphene/libgraphene/util"
-        ]
+        # All libraries are placed in lib/ of the build tree (see CMakeLists.txt)
+        self.cpp.build.libdirs = ["lib"]
 
     def requirements(self):
-        self.requires("gtest/1.16.0")
         self.requires("nlohmann_json/3.9.1") # Same version as in Poplar SDK
         self.requires("cli11/2.3.2")
         self.requires("spdlog/1.15.1")
         self.requires("fmt/11.1.3")
         self.requires("twofloat/0.2.0", transitive_headers=True)
-        self.requires("metis/5.2.1")
+        if self.options.with_metis:
+            self.requires("metis/5.2.1")
         self.requires("fast_matrix_market/1.7.6")
 
+    def build_requirements(self):
+        # Only needed for the unit tests. Skipped when installing with
+        # -c tools.graph:skip_test=True, which also needs
+        # -c tools.build:skip_test=True so that the tests are not configured
+        self.test_requires("gtest/1.16.0")
+
+    def generate(self):
+        tc = CMakeToolchain(self)
+        # Cache variables end up in the presets, so builds that configure via
+        # CMakeUserPresets.json (instead of conan build) see the option as well
+        tc.cache_variables["GRAPHENE_WITH_METIS"] = bool(self.options.with_metis)
+        tc.generate()
+        CMakeDeps(self).generate()
+
     def build(self):
         # Build list of enabled IPU architectures from options
         enabled_ipu_archs = []
@@ -83,11 +92,29 @@ class GrapheneConan(ConanFile):
         # Join the architectures with commas for the CMake variable
         ipu_archs_str = ";".join(enabled_ipu_archs)
     
-        cmake = CMake(self)
         # Pass flag to enable specific IPU architectures based on options
-        cmake.configure(variables={
-            "POPLIBS_ENABLED_IPU_ARCH_NAMES": ipu_archs_str
-        })
+        variables = {
+            "POPLIBS_ENABLED_IPU_ARCH_NAMES": ipu_archs_str,
+        }
+
+        # Conan passes the cache variables of the generated preset (e.g.
+        # BUILD_TESTING, GRAPHENE_WITH_METIS) only as -D at configure time, so
+        # they have to be part of the key as well
+        presets = json.loads(load(self, os.path.join(self.generators_folder, "CMakePresets.json")))
+        cache_variables = [p.get("cacheVariables", {}) for p in presets.get("configurePresets", [])]
+        configure_key = repr((variables, cache_variables))
+
+        cmake = CMake(self)
+        # Only configure if there is no build tree yet or the variables
+        # changed. Otherwise CMake reconfigures on its own if the toolchain or
+        # any CMakeLists.txt changed.
+        variables_file = os.path.join(self.build_folder, "graphene_configure_variables.txt")
+        if (not os.path.exists(os.path.join(self.build_folder, "CMakeCache.txt"))
+                or not os.path.exists(variables_file)
+                or load(self, variables_file) != configure_key):
+            cmake.configure(variables=variables)
+            save(self, variables_file, configure_key)
+        # Conan passes -j<tools.build:jobs> (default: all cores) to the build tool
         cmake.build()
 
     def package(self):
@@ -96,7 +123,7 @@ class GrapheneConan(ConanFile):
 
 
     def package_info(self):
-        self.cpp_info.requires = ["cli11::cli11", "gtest::gtest"]
+        self.cpp_info.requires = ["cli11::cli11"]
         self.cpp_info.system_libs = [ "poplar", "poputil", "tbb"]
         
         # Graphene (main interface library)
@@ -161,7 +188,8 @@ class GrapheneConan(ConanFile):
             "util",
             "tensor-dsl",
             "nlohmann_json::nlohmann_json",
-            "metis::metis",
             "spdlog::spdlog",
             "fmt::fmt"
-        ]
\ No newline at end of file
+        ]
+        if self.options.with_metis:
+            self.cpp_info.components["matrix"].requires.append("metis::metis")
\ No newline at end of file
@@ -1,88 +1,204 @@
-import subprocess
-import threading
-import queue
-import time
+import asyncio
+import collections
+import itertools
 import os
-import math
+import time
+from dataclasses import dataclass
+
+TILES_PER_IPU = 1472
+MAX_ATTEMPTS = 5
+MAX_BACKOFF_SECONDS = 30
+
+
+@dataclass(slots=True)
+class Task:
+    config: str
+    matrix: str
+    output_file: str
+    profiling_dir: str
+    numTiles: int
+    ipus_needed: int
+    attempts: int = 0
+
+
+def parse_name(matrix):
+    # Derive a short name for a matrix argument to be used in file names
+    flag, value = matrix[:2], matrix[2:]
+    if flag == "-m":
+        return value.rpartition("/")[2].partition(".")[0]
+    elif flag == "-p":
+        return "poisson_" + value.replace(",", "x")
+    raise ValueError(f"Unknown matrix argument: {matrix}")
 
 
-def run_program(config, matrix, output_file, profiling_dir, numTiles, program_path):
+# Directories that are known to exist. All runs share one event loop thread,
+# so no locking is required.
+_mkdir_cache = set()
+
+
+def ensure_dir(path):
+    if path not in _mkdir_cache:
+        os.makedirs(path, exist_ok=True)
+        _mkdir_cache.add(path)
+
+
+def read_tail(path, num_bytes=4096):
+    with open(path, "rb") as f:
+        f.seek(max(0, os.path.getsize(path) - num_bytes))
+        return f.read().decode(errors="replace")
+
+
+async def run_program(
+    config, matrix, output_file, profiling_dir, numTiles, program_path, attempt
+):
+    args = [program_path, config, matrix, "-t" + str(numTiles)]
     # Create the profiling directory if given
-    profiling_flag = ""
     if profiling_dir:
-        os.makedirs(profiling_dir, exist_ok=True)
-        profiling_flag = "-d" + profiling_dir
+        ensure_dir(profiling_dir)
+        args.append("-d" + profiling_dir)
 
+    # Stream stderr to a sibling file instead of buffering it in the driver
+    err_path = output_file + ".err"
+    # Start fresh on the first attempt and append on retries so that logs of
+    # failed attempts are preserved
+    flags = os.O_WRONLY | os.O_CREAT
+    flags |= os.O_TRUNC if attempt == 1 else os.O_APPEND
     try:
-        with open(output_file, "w") as out_file:
+        with (
+            os.fdopen(
+                os.open(output_file, flags, 0o644), "w", buffering=1 << 16
+            ) as out_file,
+            os.fdopen(os.open(err_path, flags, 0o644), "wb") as err_file,
+        ):
+            header = f"--- attempt {attempt} at {time.ctime()} ---\n"
+            out_file.write(header)
+            out_file.flush()
+            err_file.write(header.encode())
+            err_file.flush()
             print(f"Running {config} {matrix} with {numTiles} tiles")
-            process = subprocess.run(
-                [
-                    program_path,
-                    config,
-                    matrix,
-                    "-t" + str(numTiles),
-                    profiling_flag,
-                ],
+            # Without close_fds, cwd or preexec_fn, CPython can spawn the
+            # program via posix_spawn/vfork instead of forking the driver
+            process = await asyncio.create_subprocess_exec(
+                *args,
                 stdout=out_file,
-                stderr=subprocess.PIPE,
-                text=True,
+                stderr=err_file,
+                close_fds=False,
             )
-            print(f"Finished {config} {matrix}")
-            if process.returncode != 0:
-                print(f"Error for {config} {matrix}: {process.stderr}")
-                return False
-            return True
+            await process.wait()
+        print(f"Finished {config} {matrix}")
+        if process.returncode != 0:
+            print(f"Error for {config} {matrix}: {read_tail(err_path)}")
+            return False
+        # Keep the stderr of earlier failed attempts
+        if attempt == 1:
+            os.remove(err_path)
+        return True
     except Exception as e:
         print(f"Exception for {config} {matrix}: {e}")
+        if attempt == 1 and os.path.exists(err_path):
+            os.remove(err_path)
         return False
 
 
-def worker(program_path, task_queue, ipu_semaphore):
-    while not task_queue.empty():
-        config, matrix, output_file, profiling_dir, numTiles = task_queue.get()
-        ipus_needed = math.ceil(numTiles / 1472)
-        # Round up to the nearest multiple of 4
-        ipus_needed = 4 * math.ceil(ipus_needed / 4)
-        with ipu_semaphore(ipus_needed):
-            successfull = run_program(
-                config, matrix, output_file, profiling_dir, numTiles, program_path
+async def run_one(program_path, task, ipu_budget, failures):
+    while True:
+        async with ipu_budget(task.ipus_needed):
+            successfull = await run_program(
+                task.config,
+                task.matrix,
+                task.output_file,
+                task.profiling_dir,
+                task.numTiles,
+                program_path,
+                task.attempts + 1,
+            )
+        if successfull:
+            return
+        failures[task.config] += 1
+        task.attempts += 1
+        if task.attempts >= MAX_ATTEMPTS:
+            print(
+                f"Giving up on {task.config} {task.matrix} with {task.numTiles} tiles "
+                f"after {task.attempts} attempts"
             )
-            # Reschedule the task if it failed
-            if not successfull:
-                task_queue.put((config, matrix, output_file, profiling_dir, numTiles))
-                print(f"Rescheduled {config} {matrix} with {numTiles} tiles")
-        task_queue.task_done()
+            return
+        # Retry the task with exponential backoff
+        delay = min(MAX_BACKOFF_SECONDS, 2**task.attempts)
+        print(
+            f"Rescheduled {task.config} {task.matrix} with {task.numTiles} tiles "
+            f"in {delay}s"
+        )
+        await asyncio.sleep(delay)
+
 
+async def worker(program_path, tasks, counter, ipu_budget, failures):
+    # Tasks are all known up front, so workers simply claim the next index
+    while (i := next(counter)) < len(tasks):
+        await run_one(program_path, tasks[i], ipu_budget, failures)
 
-class IPUSemaphore:
+
+# Keeps track of the available IPUs. All runs are coroutines on the same event
+# loop, so waiting for IPUs does not block any threads. Waiters are served
+# strictly in FIFO order, so a large request is not overtaken by later small ones.
+class IPUBudget:
     def __init__(self, total_ipus):
         self.total_ipus = total_ipus
         self.available_ipus = total_ipus
-        self.lock = threading.Lock()
-        self.condition = threading.Condition(self.lock)
+        self.waiters = collections.deque()
 
     def __call__(self, ipus_needed):
         return self.IPUContext(self, ipus_needed)
 
+    async def acquire(self, ipus_needed):
+        # Only bypass the queue if nobody is waiting to keep FIFO order
+        if not self.waiters and self.available_ipus >= ipus_needed:
+            self.available_ipus -= ipus_needed
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append((ipus_needed, waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if (ipus_needed, waiter) in self.waiters:
+                self.waiters.remove((ipus_needed, waiter))
+                # The waiters behind this one may fit now
+                self._wake_waiters()
+            elif not waiter.cancelled():
+                # The IPUs were granted right before cancelling, give them back
+                self.release(ipus_needed)
+            raise
+
+    def release(self, ipus_needed):
+        self.available_ipus += ipus_needed
+        self._wake_waiters()
+
+    def _wake_waiters(self):
+        # Hand the IPUs to the longest waiting runs until the next one does not fit
+        while self.waiters:
+            n, future = self.waiters[0]
+            if future.done():
+                # Cancelled before it was granted
+                self.waiters.popleft()
+                continue
+            if n > self.available_ipus:
+                break
+            self.waiters.popleft()
+            self.available_ipus -= n
+            future.set_result(None)
+
     class IPUContext:
-        def __init__(self, semaphore, ipus_needed):
-            self.semaphore = semaphore
+        def __init__(self, budget, ipus_needed):
+            self.budget = budget
             self.ipus_needed = ipus_needed
 
-        def __enter__(self):
-            with self.semaphore.condition:
-                while self.semaphore.available_ipus < self.ipus_needed:
-                    self.semaphore.condition.wait()
-                self.semaphore.available_ipus -= self.ipus_needed
+        async def __aenter__(self):
+            await self.budget.acquire(self.ipus_needed)
 
-        def __exit__(self, exc_type, exc_val, exc_tb):
-            with self.semaphore.condition:
-                self.semaphore.available_ipus += self.ipus_needed
-                self.semaphore.condition.notify_all()
+        async def __aexit__(self, exc_type, exc_val, exc_tb):
+            self.budget.release(self.ipus_needed)
 
 
-def main():
+async def main():
     # log_dir = "logs/profiling_runs/"
     log_dir = "logs/convergence_plot/"
     config_files = [
@@ -123,46 +239,63 @@ def main():
 
     program_path = "../../build/applications/benchmark/benchmark"
 
-    task_queue = queue.Queue()
-    for numTiles in tiles:
-        for config in config_files:
+    profiling_configs = frozenset(config_files_that_require_profiling)
+
+    # Precompute the matrix names used in the output paths once
+    mats = [(m, parse_name(m)) for m in matrices]
+
+    # Number of IPUs per tile count, rounded up to the nearest multiple of 4
+    ipus_for = {t: (-(-t // TILES_PER_IPU) + 3) & ~3 for t in tiles}
+
+    tasks = []
+    for config in config_files:
+        needs_profiling = config in profiling_configs
+        config_name = config.split(".")[0]
+        output_template = f"{log_dir}/{config_name}_{{m}}_{{t}}tiles.txt"
+        profiling_template = f"{log_dir}/profiling/{config_name}_{{m}}_{{t}}tiles"
+        for numTiles in tiles:
             ## For the weak scaling
             # nx = int((rowsPerTile * numTiles) ** (1 / 3))
-            # matrices = [f"-p{nx},{nx},{nx}"]
-            for matrix in matrices:
-                config_name = config.split(".")[0]
-                if matrix.startswith("-m"):
-                    matrix_name = matrix.lstrip("-m").split("/")[-1].split(".")[0]
-                elif matrix.startswith("-p"):
-                    poissonConfig = matrix.lstrip("-p").split(",")
-                    matrix_name = f"poisson_{poissonConfig[0]}x{poissonConfig[1]}x{poissonConfig[2]}"
+            # mats = [(f"-p{nx},{nx},{nx}", f"poisson_{nx}x{nx}x{nx}")]
+            for matrix, matrix_name in mats:
                 profiling_dir = ""
-                if config in config_files_that_require_profiling:
-                    profiling_dir = f"{log_dir}/profiling/{config_name}_{matrix_name}_{numTiles}tiles"
-                output_file = (
-                    f"{log_dir}/{config_name}_{matrix_name}_{numTiles}tiles.txt"
+                if needs_profiling:
+                    profiling_dir = profiling_template.format(m=matrix_name, t=numTiles)
+                output_file = output_template.format(m=matrix_name, t=numTiles)
+                tasks.append(
+                    Task(
+                        config,
+                        matrix,
+                        output_file,
+                        profiling_dir,
+                        numTiles,
+                        ipus_for[numTiles],
+                    )
                 )
-                task_queue.put((config, matrix, output_file, profiling_dir, numTiles))
 
-    total_ipus = 16
-    ipu_semaphore = IPUSemaphore(total_ipus)
-    max_workers = (
-        total_ipus  # Set the number of worker threads to the total number of IPUs
-    )
+    # Create all output directories up front
+    ensure_dir(log_dir)
+    for task in tasks:
+        if task.profiling_dir:
+            ensure_dir(task.profiling_dir)
 
-    threads = []
-    for _ in range(max_workers):
-        thread = threading.Thread(
-            target=worker, args=(program_path, task_queue, ipu_semaphore)
-        )
-        thread.start()
-        threads.append(thread)
+    total_ipus = 16
+    ipu_budget = IPUBudget(total_ipus)
+    max_workers = total_ipus  # At most one run per IPU can be active
 
-    task_queue.join()
+    counter = itertools.count()
+    failures = collections.Counter()
+    await asyncio.gather(
+        *[
+            worker(program_path, tasks, counter, ipu_budget, failures)
+            for _ in range(max_workers)
+        ]
+    )
 
-    for thread in threads:
-        thread.join()
+    # Summarize the failed runs per config
+    for config, count in failures.items():
+        print(f"{count} failed run(s) for {config}")
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -29,6 +29,18 @@
 
 namespace graphene::matrix::host {
 
+namespace {
+fast_matrix_market::read_options getReadOptions() {
+  fast_matrix_market::read_options options;
+#ifdef FMM_PARALLELISM_DEFAULT
+  // Number of parser threads configured by the fast_matrix_market package. 0
+  // uses all hardware threads.
+  options.num_threads = FMM_PARALLELISM_DEFAULT;
+#endif
+  return options;
+}
+}  // namespace
+
 template <FloatDataType Type>
 TripletMatrix<Type> loadTripletMatrixFromFile(std::filesystem::path path) {
   GRAPHENE_TRACEPOINT();
@@ -46,7 +58,8 @@ TripletMatrix<Type> loadTripletMatrixFromFile(std::filesystem::path path) {
     std::vector<Type> vals;
   } mat;
   fast_matrix_market::read_matrix_market_triplet(
-      matrixFile, mat.nrows, mat.ncols, mat.rows, mat.cols, mat.vals);
+      matrixFile, mat.nrows, mat.ncols, mat.rows, mat.cols, mat.vals,
+      getReadOptions());
   matrixFile.close();
 
   spdlog::info("Matrix has {} rows, {} columns and {} non-zero entries",
@@ -95,7 +108,8 @@ DoubletVector<Type> loadDoubletVectorFromFile(std::filesystem::path path) {
     spdlog::debug("Matrix market file {} is a vector, reading it",
                   path.string());
     fast_matrix_market::read_matrix_market_doublet(
-        fileStream, vector.nrows, vector.indices, vector.values);
+        fileStream, vector.nrows, vector.indices, vector.values,
+        getReadOptions());
     fileStream.close();
   } else {
     throw std::runtime_error(
@@ -18,7 +18,6 @@
 
 #include "libgraphene/matrix/host/details/crs/CRSHostMatrix.hpp"
 
-#include <metis.h>
 #include <spdlog/spdlog.h>
 
 #include <algorithm>
@@ -31,6 +30,10 @@
 #include <ranges>
 #include <stdexcept>
 
+#ifdef GRAPHENE_WITH_METIS
+#include <metis.h>
+#endif
+
 #include "libgraphene/common/Concepts.hpp"
 #include "libgraphene/common/Shape.hpp"
 #include "libgraphene/common/TileMapping.hpp"
@@ -48,6 +51,7 @@
 using namespace graphene;
 
 namespace {
+#ifdef GRAPHENE_WITH_METIS
 template <DataType Type>
 static id_t getEdgeWeight(Type edgeCoeff, Type maxEdgeCoeff,
                           int maxEdgeWeight) {
@@ -56,6 +60,7 @@ static id_t getEdgeWeight(Type edgeCoeff, Type maxEdgeCoeff,
   return std::max<int>(1,
                        absLinearInterp);  // Each edge weight must be at least 1
 }
+#endif
 
 }  // namespace
 
@@ -143,20 +148,23 @@ Partitioning CRSHostMatrix::calculatePartitioning(
   GRAPHENE_TRACEPOINT();
   spdlog::info("Distributing matrix to {} processors", numTiles);
 
-  // number of vertices
-  idx_t nvtxs = (idx_t)addressing.rowPtr.size() - 1;
-
-  // number of processors
-  idx_t nparts = (idx_t)numTiles;
-  if (nparts == 1) {
+  size_t numRows = addressing.rowPtr.size() - 1;
+  if (numTiles == 1) {
     spdlog::warn("Only one processor, skipping matrix partitioning");
     Partitioning partitioning;
     partitioning.numTiles = 1;
     numTiles = 1;
-    partitioning.rowToTile.resize(nvtxs, 0);
+    partitioning.rowToTile.resize(numRows, 0);
     return partitioning;
   }
 
+#ifdef GRAPHENE_WITH_METIS
+  // number of vertices
+  idx_t nvtxs = (idx_t)numRows;
+
+  // number of processors
+  idx_t nparts = (idx_t)numTiles;
+
   // number of balancing constraints
   idx_t ncon = 1;
 
@@ -231,12 +239,24 @@ Partitioning CRSHostMatrix::calculatePartitioning(
   }
 
   spdlog::trace("Total edgecut after partitioning: {}", edgecut);
+#else
+  // Without METIS, assign contiguous blocks of rows to the processors so that
+  // each processor stores roughly the same number of values
+  spdlog::warn("Graphene was built without METIS, partitioning rows linearly");
+  size_t totalWeight = addressing.colInd.size() + numRows;
+  size_t weight = 0;
+  std::vector<size_t> part(numRows);
+  for (size_t i = 0; i < numRows; i++) {
+    part[i] = std::min(weight * numTiles / totalWeight, numTiles - 1);
+    weight += addressing.rowPtr[i + 1] - addressing.rowPtr[i] + 1;
+  }
+#endif
 
   /// When the number of requested tiles is large compared to the matrix, some
   /// tiles might end up empty. We need to shift the partitioning to remove
   /// these empty tiles.
   std::vector<size_t> verticesPerProc(numTiles, 0);
-  for (size_t i = 0; i < nvtxs; i++) {
+  for (size_t i = 0; i < numRows; i++) {
     verticesPerProc[part[i]]++;
   }
 
@@ -258,8 +278,8 @@ Partitioning CRSHostMatrix::calculatePartitioning(
   // Copy partitioning to the output, accounting for empty processors
   Partitioning partitioning;
   partitioning.numTiles = numTiles;
-  partitioning.rowToTile.reserve(nvtxs);
-  for (size_t i = 0; i < nvtxs; i++) {
+  partitioning.rowToTile.reserve(numRows);
+  for (size_t i = 0; i < numRows; i++) {
     partitioning.rowToTile.push_back(procToShiftedProcMapping[part[i]]);
   }
   spdlog::info(